@@ -0,0 +1,25 @@
+"""add composite index to samples
+
+Revision ID: b7d41c0a9f23
+Revises: ac8256c291d4
+Create Date: 2026-08-31 10:12:41.183520
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b7d41c0a9f23"
+down_revision = "ac8256c291d4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Queries that fetch the samples of a sku ordered by time currently use
+    # the single-column sku_index index and then sort the matching rows; a
+    # composite (sku_index, sample_time) index serves them directly.
+    op.create_index("ix_samples_sku_time", "samples", ["sku_index", "sample_time"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_samples_sku_time", "samples")
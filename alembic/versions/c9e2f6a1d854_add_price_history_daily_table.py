@@ -0,0 +1,64 @@
+"""add price_history_daily table
+
+Revision ID: c9e2f6a1d854
+Revises: b7d41c0a9f23
+Create Date: 2026-08-31 10:44:17.902213
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c9e2f6a1d854"
+down_revision = "b7d41c0a9f23"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    db = op.get_bind()
+
+    print(">>> Creating price_history_daily table")
+    op.create_table(
+        "price_history_daily",
+        sa.Column("sku_index", sa.Integer(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("min_price_cents", sa.Integer(), nullable=False),
+        sa.Column("max_price_cents", sa.Integer(), nullable=False),
+        sa.Column("last_price_cents", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["sku_index"],
+            ["skus.index"],
+        ),
+        sa.PrimaryKeyConstraint("sku_index", "day"),
+    )
+
+    # Backfill the rollup from the existing samples.  The min/max aggregates
+    # come from a single grouped scan; the "last price of the day" needs a
+    # second pass since it can't be expressed in the same GROUP BY.
+    print(">>> Backfilling rollup from samples")
+    db.execute(
+        sa.text(
+            "INSERT INTO price_history_daily "
+            "(sku_index, day, min_price_cents, max_price_cents, last_price_cents) "
+            "SELECT sku_index, date(sample_time), min(price_cents), "
+            "max(price_cents), 0 "
+            "FROM samples GROUP BY sku_index, date(sample_time)"
+        )
+    )
+
+    print(">>> Filling last price of each day")
+    db.execute(
+        sa.text(
+            "UPDATE price_history_daily SET last_price_cents = ("
+            "SELECT price_cents FROM samples "
+            "WHERE samples.sku_index = price_history_daily.sku_index "
+            "AND date(samples.sample_time) = price_history_daily.day "
+            'ORDER BY samples.sample_time DESC, samples."index" DESC LIMIT 1)'
+        )
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("price_history_daily")
@@ -0,0 +1,27 @@
+"""drop redundant primary key index
+
+Revision ID: e1a4c7b09d32
+Revises: c9e2f6a1d854
+Create Date: 2026-08-31 14:08:55.331402
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e1a4c7b09d32"
+down_revision = "c9e2f6a1d854"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The integer primary key is the rowid in SQLite; the explicit unique
+    # index on it is redundant and only adds a B-tree update per insert.
+    print(">>> Dropping redundant index on products_static.index")
+    op.drop_index("ix_products_static_index", "products_static")
+
+
+def downgrade() -> None:
+    op.create_index(
+        "ix_products_static_index", "products_static", ["index"], unique=True
+    )
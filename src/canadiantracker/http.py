@@ -84,7 +84,12 @@ async def api_skus_samples(sku_code: str) -> list[dict]:
     if sku is None:
         raise HTTPException(status_code=404, detail="SKU not found")
 
-    return [serialize_product_info_sample(sample) for sample in sku.samples]
+    # Stream the history rather than loading it through the relationship,
+    # which would materialize every sample of the sku at once.
+    return [
+        serialize_product_info_sample(sample)
+        for sample in _repository.samples_by_sku_code(sku_code)
+    ]
 
 
 @app.get("/", response_class=HTMLResponse)
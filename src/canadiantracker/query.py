@@ -49,19 +49,20 @@ def price_history(db_path: str, format: str, sku_code: str):
         db_path
     )
 
-    sku = repository.get_sku_by_formatted_code(sku_code)
-    if sku is None:
-        click.echo(
-            click.style("Error: ", fg="red", bold=True)
-            + "No SKU with code "
-            + click.style(sku_code, fg="white", bold=True)
-        )
-        sys.exit(1)
+    with repository:
+        sku = repository.get_sku_by_formatted_code(sku_code)
+        if sku is None:
+            click.echo(
+                click.style("Error: ", fg="red", bold=True)
+                + "No SKU with code "
+                + click.style(sku_code, fg="white", bold=True)
+            )
+            sys.exit(1)
 
-    if format == "json":
-        json_history(sku)
-    elif format == "plot":
-        plot_history(sku)
+        if format == "json":
+            json_history(sku)
+        elif format == "plot":
+            plot_history(sku)
 
 
 def plot_history(sku: storage._StorageSku):
@@ -127,17 +127,14 @@ def scrape_products(
         # output very spammy
         progress_bar_settings["bar_template"] = ""
 
-    with click.progressbar(inventory, **progress_bar_settings) as bar_wrapper:
-        for product in bar_wrapper:
-            try:
-                repository.add_product(
-                    product.code, product.name, product.is_in_clearance, product.url
-                )
-            except ValueError as e:
-                logging.warning(
-                    f"Failed to add product: code=`{product.code}`, name=`{product.name}`, url=`{product.url}` : {e}"
-                )
-                continue
+    with repository, click.progressbar(
+        inventory, **progress_bar_settings
+    ) as bar_wrapper:
+        with repository.bulk_write():
+            # add_products consumes the iterator in chunks, batching the
+            # existence checks and inserts; products with an invalid code
+            # are skipped (with a warning) rather than aborting the scrape.
+            repository.add_products(bar_wrapper)
 
 
 @cli.command(name="scrape-skus", short_help="fetch static product properties")
@@ -178,17 +175,18 @@ def scrape_skus(db_path: str, products: str | None):
         # output very spammy
         progress_bar_settings["bar_template"] = ""
 
-    with click.progressbar(
+    with repository, click.progressbar(
         repository.products(codes=products_list), **progress_bar_settings
     ) as products_wrapper:
-        for i, product in enumerate(products_wrapper):
-            try:
-                for sku in triangle.SkusInventory(product.code):
-                    repository.add_sku(product, sku.code, sku.formatted_code)
-            except triangle.NoSuchProductException:
-                logger.debug(f"Product {product} no longer exists")
-            except triangle.UnknownProductErrorException:
-                logger.debug(f"Unknown error while getting product {product}")
+        with repository.bulk_write():
+            for i, product in enumerate(products_wrapper):
+                try:
+                    for sku in triangle.SkusInventory(product.code):
+                        repository.add_sku(product, sku.code, sku.formatted_code)
+                except triangle.NoSuchProductException:
+                    logger.debug(f"Product {product} no longer exists")
+                except triangle.UnknownProductErrorException:
+                    logger.debug(f"Unknown error while getting product {product}")
 
 
 @cli.command(name="scrape-prices", short_help="fetch current product prices")
@@ -235,19 +233,33 @@ def scrape_prices(db_path: str, older_than: int, discard_equal: bool):
         # output very spammy
         progress_bar_settings["bar_template"] = ""
 
-    with click.progressbar(
+    with repository, click.progressbar(
         repository.skus, length=repository.skus.count(), **progress_bar_settings
     ) as skus:
         ledger = triangle.ProductLedger(map(lambda s: s.code, skus))
 
-        for info in ledger:
-            # Some responses have null as the current price.
-            if info.price is None:
-                continue
+        # Accumulate samples and hand them to the repository in batches so
+        # sku lookups and inserts are amortized over many rows.
+        batch_size = 500
+
+        with repository.bulk_write():
+            pending: list[storage.Sample] = []
+            for info in ledger:
+                # Some responses have null as the current price.
+                if info.price is None:
+                    continue
+
+                pending.append(
+                    storage.Sample(
+                        info.code, info.price, info.in_promo, info.raw_payload
+                    )
+                )
 
-            repository.add_product_price_sample(
-                info.code, info.price, info.in_promo, info.raw_payload, discard_equal
-            )
+                if len(pending) == batch_size:
+                    repository.add_product_price_samples(pending, discard_equal)
+                    pending = []
+
+            repository.add_product_price_samples(pending, discard_equal)
 
 
 @cli.command(name="prune-samples", short_help="prune redundant samples")
@@ -278,7 +290,7 @@ def prune_samples(db_path: str):
 
         return f"Deleted: {n_deleted}"
 
-    with click.progressbar(
+    with repository, click.progressbar(
         repository.samples,
         repository.samples.count(),
         show_eta=False,
@@ -321,10 +333,15 @@ def prune_samples(db_path: str):
                 last_samples[sample.sku_index] = (sample, is_interval_start)
 
             if quit:
-                repository.flush()
-                raise KeyboardInterrupt
+                # Break out so the context manager commits what we have so
+                # far; the KeyboardInterrupt is re-raised below.
+                break
+
+        if not quit:
+            repository.vacuum()
 
-        repository.vacuum()
+    if quit:
+        raise KeyboardInterrupt
 
 
 if __name__ == "__main__":
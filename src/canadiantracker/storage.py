@@ -1,12 +1,17 @@
 from __future__ import annotations
 
+import contextlib
 import datetime
 import decimal
+import functools
 import logging
 import os
 import re
+import typing
+from collections.abc import Iterable, Iterator
 
 import sqlalchemy
+import sqlalchemy.dialects.sqlite
 from sqlalchemy import orm
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -36,7 +41,7 @@ class _StorageProduct(_Base):
     # static product properties
     __tablename__ = "products_static"
 
-    index: Mapped[int] = mapped_column(primary_key=True, unique=True, index=True)
+    index: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str]
     code: Mapped[str] = mapped_column(unique=True)
     is_in_clearance: Mapped[bool | None]
@@ -47,11 +52,20 @@ class _StorageProduct(_Base):
 
     skus: Mapped[list[_StorageSku]] = relationship(back_populates="product")
 
-    def __init__(self, name: str, code: str, is_in_clearance: bool, url: str):
+    def __init__(
+        self,
+        name: str,
+        code: str,
+        is_in_clearance: bool,
+        url: str,
+        last_listed: datetime.datetime | None = None,
+    ):
         self.name = name
         self.code = code
         self.is_in_clearance = is_in_clearance
-        self.last_listed = datetime.datetime.now()
+        # Callers ingesting whole batches pass a timestamp captured once for
+        # the batch rather than paying a datetime.now() call per entry.
+        self.last_listed = last_listed if last_listed else datetime.datetime.now()
         self.url = url
 
     def __repr__(self):
@@ -90,15 +104,9 @@ class _StorageSku(_Base):
 
     def __repr__(self):
         return (
-            "_StorageSku("
-            + ", ".join(
-                [
-                    f"code={self.code}",
-                    f"formatted_code={self.formatted_code}",
-                    f"product_index={self.product_index}",
-                ]
-            )
-            + ")"
+            f"_StorageSku(code={self.code}, "
+            f"formatted_code={self.formatted_code}, "
+            f"product_index={self.product_index})"
         )
 
 
@@ -106,7 +114,7 @@ class _StorageProductSample(_Base):
     # sample of dynamic product properties
     __tablename__ = "samples"
 
-    index: Mapped[int] = mapped_column(primary_key=True, unique=True, index=True)
+    index: Mapped[int] = mapped_column(primary_key=True)
     sample_time: Mapped[datetime.datetime]
     sku_index: Mapped[int] = mapped_column(
         sqlalchemy.ForeignKey("skus.index"),
@@ -124,11 +132,14 @@ class _StorageProductSample(_Base):
         in_promo: bool,
         raw_payload: str,
         sku: _StorageSku,
+        sample_time: datetime.datetime | None = None,
     ):
         self.price_cents = int(price * 100)
         self.in_promo = in_promo
-        self.raw_payload = str(raw_payload)
-        self.sample_time = datetime.datetime.now()
+        self.raw_payload = raw_payload
+        # See _StorageProduct.__init__: batch ingestion passes one timestamp
+        # for the whole batch instead of calling datetime.now() per sample.
+        self.sample_time = sample_time if sample_time else datetime.datetime.now()
         self.sku = sku
 
     @property
@@ -137,16 +148,43 @@ class _StorageProductSample(_Base):
 
     def __repr__(self):
         return (
-            "_StorageProductSample("
-            + ", ".join(
-                [
-                    f"index={self.index}",
-                    f"sample_time={self.sample_time}",
-                    f"sku_index={self.sku_index}",
-                    f"price_cents={self.price_cents}",
-                ]
-            )
-            + ")"
+            f"_StorageProductSample(index={self.index}, "
+            f"sample_time={self.sample_time}, "
+            f"sku_index={self.sku_index}, "
+            f"price_cents={self.price_cents})"
+        )
+
+
+# Serves "samples of a sku, ordered by time" directly from the index, without
+# a sort step on the matching rows.
+sqlalchemy.Index(
+    "ix_samples_sku_time",
+    _StorageProductSample.sku_index,
+    _StorageProductSample.sample_time,
+)
+
+
+class _StorageProductPriceDaily(_Base):
+    # Per-day, per-sku price rollup, maintained incrementally as samples are
+    # ingested.  Reading a sku's price history from here is O(days) instead
+    # of O(samples).
+    __tablename__ = "price_history_daily"
+
+    sku_index: Mapped[int] = mapped_column(
+        sqlalchemy.ForeignKey("skus.index"), primary_key=True
+    )
+    day: Mapped[datetime.date] = mapped_column(primary_key=True)
+    min_price_cents: Mapped[int]
+    max_price_cents: Mapped[int]
+    last_price_cents: Mapped[int]
+
+    def __repr__(self):
+        return (
+            f"_StorageProductPriceDaily(sku_index={self.sku_index}, "
+            f"day={self.day}, "
+            f"min_price_cents={self.min_price_cents}, "
+            f"max_price_cents={self.max_price_cents}, "
+            f"last_price_cents={self.last_price_cents})"
         )
 
 
@@ -158,11 +196,16 @@ class InvalidDatabaseRevisionException(Exception):
         return f"Failed to validate database revision: {self._msg}"
 
 
+# Compiled once: this check runs for every code passed to `products()` and
+# `get_product_by_code`, so don't go through the `re` module cache each time.
+_PRODUCT_CODE_RE = re.compile(r"^\d{7}P$")
+
+
 def _validate_product_code_format(product_code: str):
     """Validate that the given product code is in the expected format.
 
     If not, raise a ValueError."""
-    if not re.match(r"^\d{7}P$", product_code):
+    if not _PRODUCT_CODE_RE.match(product_code):
         raise ValueError(f"Wrong format for product code: {product_code}")
 
 
@@ -176,31 +219,78 @@ class Sample:
         self.raw_payload = raw_payload
 
 
-def _set_wal_mode(dbapi_connection, connection_record):
+def _set_connection_pragmas(dbapi_connection, connection_record):
     cursor = dbapi_connection.cursor()
+    # WAL lets readers and writers proceed concurrently and batches dirty
+    # pages; with it, synchronous=NORMAL is safe (a crash can only lose the
+    # last transaction, not corrupt the database) and drops the extra fsync
+    # at every commit.  The remaining pragmas trade a bit of memory for
+    # fewer trips to disk: temporary structures stay in RAM, the page cache
+    # is raised to 64 MiB and reads go through a 256 MiB mmap window.
     cursor.execute("PRAGMA journal_mode=WAL;")
+    cursor.execute("PRAGMA synchronous=NORMAL;")
+    cursor.execute("PRAGMA temp_store=MEMORY;")
+    cursor.execute("PRAGMA cache_size=-65536;")
+    cursor.execute("PRAGMA mmap_size=268435456;")
     cursor.close()
 
 
+@functools.lru_cache(maxsize=None)
+def _engine_for(path: str) -> sqlalchemy.engine.Engine:
+    """Return a (cached) engine for the database at `path`.
+
+    Engine creation runs schema inspection against the file; memoizing it
+    per path turns repeated repository instantiations into a plain session
+    checkout from the already-validated engine's pool.  Failed validations
+    are not cached, so a database that gets migrated later is re-inspected.
+    """
+    db_url = "sqlite:///" + path
+    logger.debug("Creating engine with url %s", db_url)
+    # The web server calls into the repository from worker threads, so
+    # don't let pysqlite pin connections to their creating thread, and
+    # give writers a generous busy timeout instead of failing fast on a
+    # locked database.
+    engine = sqlalchemy.create_engine(
+        db_url,
+        echo=False,
+        pool_pre_ping=True,
+        # Let bulk inserts emit multi-row VALUES lists of up to 500 rows
+        # per statement instead of one statement per row.
+        insertmanyvalues_page_size=500,
+        connect_args={"check_same_thread": False, "timeout": 30},
+    )
+
+    sqlalchemy.event.listen(engine, "connect", _set_connection_pragmas)
+
+    inspector: sqlalchemy.engine.reflection.Inspector = sqlalchemy.inspect(engine)
+    if not inspector.has_table("alembic_version"):
+        raise InvalidDatabaseRevisionException(
+            "database is missing the alembic_version table"
+        )
+
+    return engine
+
+
 class ProductRepository:
-    ALEMBIC_REVISION = "ac8256c291d4"
+    ALEMBIC_REVISION = "e1a4c7b09d32"
 
     def __init__(self, path: str):
-        db_url = "sqlite:///" + os.path.abspath(path)
-        logger.debug(f"Creating ProductRepository with url {db_url}")
-        self._engine = sqlalchemy.create_engine(db_url, echo=False)
+        self._engine = _engine_for(os.path.abspath(path))
+        self._session: orm.Session = orm.sessionmaker(bind=self._engine)()
 
-        sqlalchemy.event.listen(self._engine, "connect", _set_wal_mode)
+        # Cache of products already looked up (or inserted) by add_product,
+        # keyed by product code.
+        self._product_cache: dict[str, _StorageProduct] = {}
 
-        inspector: sqlalchemy.engine.reflection.Inspector = sqlalchemy.inspect(
-            self._engine
+        # Sku lookups run once per sample in the single-row ingest path;
+        # build their statements once so the SQL compilation cost isn't paid
+        # on every call.
+        self._sku_by_code_stmt = sqlalchemy.select(_StorageSku).where(
+            _StorageSku.code == sqlalchemy.bindparam("code")
+        )
+        self._sku_by_formatted_code_stmt = sqlalchemy.select(_StorageSku).where(
+            _StorageSku.formatted_code == sqlalchemy.bindparam("formatted_code")
         )
-        if not inspector.has_table("alembic_version"):
-            raise InvalidDatabaseRevisionException(
-                "database is missing the alembic_version table"
-            )
-
-        self._session: orm.Session = orm.sessionmaker(bind=self._engine)()
 
         revs: list[_AlembicRevision] = self._session.query(_AlembicRevision).all()
 
@@ -213,20 +303,54 @@ class ProductRepository:
                 f"expected {self.ALEMBIC_REVISION}, got {rev}"
             )
 
-    def __del__(self):
-        if hasattr(self, "_session"):
-            self._session.commit()
-
-    def products(self, codes: list[str] | None = None) -> orm.Query[_StorageProduct]:
-        q = self._session.query(_StorageProduct)
-
-        if codes is not None:
-            for code in codes:
-                _validate_product_code_format(code)
+    def __enter__(self) -> ProductRepository:
+        return self
 
-            q = q.filter(_StorageProduct.code.in_(codes))
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        # Commit on a clean exit only: an exception during ingestion must not
+        # commit a partial batch, which the previous __del__-time commit did.
+        if exc_type is None:
+            self._session.commit()
+            self.optimize()
+        else:
+            self._session.rollback()
+
+        # Only close the session: the engine (and its connection pool) is
+        # shared process-wide through _engine_for, so disposing it here would
+        # pull connections out from under any other live repository.
+        self._session.close()
+
+    # Maximum number of codes per IN (...) clause; SQLite limits the number
+    # of bound variables per statement (999 by default).
+    _CODES_CHUNK_SIZE = 500
+
+    @typing.overload
+    def products(self, codes: None = None) -> orm.Query[_StorageProduct]:
+        ...
+
+    @typing.overload
+    def products(self, codes: list[str]) -> Iterator[_StorageProduct]:
+        ...
+
+    def products(
+        self, codes: list[str] | None = None
+    ) -> orm.Query[_StorageProduct] | Iterator[_StorageProduct]:
+        if codes is None:
+            return self._session.query(_StorageProduct)
+
+        for code in codes:
+            _validate_product_code_format(code)
+
+        def iter_chunks() -> Iterator[_StorageProduct]:
+            # Query by chunks so a large codes list doesn't produce one
+            # enormous statement.
+            for chunk_start in range(0, len(codes), self._CODES_CHUNK_SIZE):
+                chunk_end = chunk_start + self._CODES_CHUNK_SIZE
+                yield from self._session.query(_StorageProduct).filter(
+                    _StorageProduct.code.in_(codes[chunk_start:chunk_end])
+                )
 
-        return q
+        return iter_chunks()
 
     @property
     def skus(self) -> orm.Query[_StorageSku]:
@@ -238,9 +362,67 @@ class ProductRepository:
         # all samples at once.
         return self._session.query(_StorageProductSample).yield_per(10000)
 
+    def samples_by_sku_code(self, sku_code: str) -> orm.Query[_StorageProductSample]:
+        """Stream the samples of a sku in chronological order.
+
+        Unlike the `samples` relationship, this does not materialize the
+        whole history at once; rows are hydrated in batches as the result
+        is iterated."""
+        return (
+            self._session.query(_StorageProductSample)
+            .join(_StorageSku)
+            .filter(_StorageSku.code == sku_code)
+            .order_by(_StorageProductSample.sample_time)
+            .yield_per(1000)
+        )
+
+    def get_latest_sample_by_sku_code(
+        self, sku_code: str
+    ) -> _StorageProductSample | None:
+        """Return the most recent sample of a sku, or None if it has none.
+
+        The (sku_index, sample_time) index serves the ORDER BY ... LIMIT 1
+        directly, so this is an index seek rather than a history scan."""
+        return (
+            self._session.query(_StorageProductSample)
+            .join(_StorageSku)
+            .filter(_StorageSku.code == sku_code)
+            .order_by(_StorageProductSample.sample_time.desc())
+            .limit(1)
+            .one_or_none()
+        )
+
     def flush(self):
         self._session.flush()
 
+    @contextlib.contextmanager
+    def bulk_write(self) -> Iterator[None]:
+        """Run a batch of writes as a single transaction.
+
+        Opening the transaction with BEGIN IMMEDIATE takes the writer lock
+        once for the whole batch and results in a single fsync at commit,
+        instead of one per intermediate flush."""
+        # Complete any implicitly-started transaction first; BEGIN can't be
+        # emitted from within a transaction.
+        if self._session.in_transaction():
+            self._session.commit()
+
+        self._session.execute(sqlalchemy.text("BEGIN IMMEDIATE"))
+        try:
+            yield
+        except BaseException:
+            self._session.rollback()
+            raise
+        else:
+            self._session.commit()
+
+    def optimize(self):
+        # Lightweight routine maintenance: refreshes the query planner's
+        # statistics for tables that need it.  Unlike VACUUM, this does not
+        # rewrite the database file, so it is cheap enough to run on every
+        # clean shutdown.
+        self._session.execute(sqlalchemy.text("PRAGMA optimize"))
+
     def vacuum(self):
         # Vacuum can't be run during a transaction; complete the current
         # transaction before vacuuming.
@@ -254,28 +436,62 @@ class ProductRepository:
 
     def get_product_by_code(self, product_code: str) -> _StorageProduct | None:
         _validate_product_code_format(product_code)
-        result = self.products().filter(_StorageProduct.code == product_code)
+        result = (
+            self.products()
+            .options(orm.selectinload(_StorageProduct.skus))
+            .filter(_StorageProduct.code == product_code)
+        )
         return result.first() if result else None
 
     def get_sku_by_code(self, code: str) -> _StorageSku | None:
-        result = self.skus.filter(_StorageSku.code == code)
-        return result.first() if result else None
+        return (
+            self._session.execute(self._sku_by_code_stmt, {"code": code})
+            .scalars()
+            .first()
+        )
 
     def get_sku_by_formatted_code(self, sku_formatted_code: str) -> _StorageSku | None:
-        result = self.skus.filter(_StorageSku.formatted_code == sku_formatted_code)
-        return result.first() if result else None
+        return (
+            self._session.execute(
+                self._sku_by_formatted_code_stmt,
+                {"formatted_code": sku_formatted_code},
+            )
+            .scalars()
+            .first()
+        )
 
-    def add_product(self, code: str, name: str, is_in_clearance: bool, url: str):
+    def add_product(
+        self,
+        code: str,
+        name: str,
+        is_in_clearance: bool,
+        url: str,
+        last_listed: datetime.datetime | None = None,
+    ):
         logger.debug("Attempting to add product: code = `%s`", code)
         _validate_product_code_format(code)
-        entry = self._session.query(_StorageProduct).filter_by(code=code).first()
+
+        # Listings regularly repeat product codes (pagination overlap, a
+        # product belonging to several categories); serve those from the
+        # in-process cache instead of re-querying products_static.
+        entry = self._product_cache.get(code)
+        if entry is None:
+            entry = self._session.query(_StorageProduct).filter_by(code=code).first()
+            if entry is not None:
+                self._product_cache[code] = entry
+
         logger.debug("Product %s present in storage", "is" if entry else "is not")
 
+        if last_listed is None:
+            last_listed = datetime.datetime.now()
+
         if not entry:
-            self._session.add(_StorageProduct(name, code, is_in_clearance, url))
+            entry = _StorageProduct(name, code, is_in_clearance, url, last_listed)
+            self._session.add(entry)
+            self._product_cache[code] = entry
         else:
             # update last listed time
-            entry.last_listed = datetime.datetime.now()
+            entry.last_listed = last_listed
 
             # Update URL, name and "in clearance" status, these can change over
             # time.
@@ -288,19 +504,101 @@ class ProductRepository:
             if entry.is_in_clearance != is_in_clearance:
                 entry.is_in_clearance = is_in_clearance
 
+    def add_products(
+        self,
+        products: Iterable,
+        last_listed: datetime.datetime | None = None,
+    ):
+        """Add or refresh a batch of product listings.
+
+        `products` is an iterable of objects with `code`, `name`,
+        `is_in_clearance` and `url` attributes (e.g. triangle.Product).
+        Existing entries are fetched with one query per chunk instead of one
+        existence check per product; entries with an invalid product code
+        are skipped with a warning."""
+        if last_listed is None:
+            last_listed = datetime.datetime.now()
+
+        batch = []
+        seen_codes = set()
+        for product in products:
+            try:
+                _validate_product_code_format(product.code)
+            except ValueError as e:
+                logger.warning(
+                    "Failed to add product: code=`%s`, name=`%s`, url=`%s` : %s",
+                    product.code,
+                    product.name,
+                    product.url,
+                    e,
+                )
+                continue
+
+            # Listings repeat codes (pagination overlap, multi-category
+            # products); only the first occurrence matters for this batch.
+            if product.code in seen_codes:
+                continue
+            seen_codes.add(product.code)
+
+            batch.append(product)
+            if len(batch) == self._CODES_CHUNK_SIZE:
+                self._add_products_chunk(batch, last_listed)
+                batch = []
+
+        if batch:
+            self._add_products_chunk(batch, last_listed)
+
+    def _add_products_chunk(self, products: list, last_listed: datetime.datetime):
+        rows = [
+            {
+                "name": product.name,
+                "code": product.code,
+                "is_in_clearance": product.is_in_clearance,
+                "last_listed": last_listed,
+                "url": product.url,
+            }
+            for product in products
+        ]
+
+        # A single UPSERT replaces the SELECT-then-INSERT/UPDATE dance: new
+        # codes are inserted, known codes get their last listed time (and the
+        # properties that change over time) refreshed.
+        upsert = sqlalchemy.dialects.sqlite.insert(_StorageProduct)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=["code"],
+            set_={
+                "name": upsert.excluded.name,
+                "is_in_clearance": upsert.excluded.is_in_clearance,
+                "last_listed": upsert.excluded.last_listed,
+                "url": upsert.excluded.url,
+            },
+        )
+        self._session.execute(upsert, rows)
+
     def add_sku(self, product: _StorageProduct, code: str, formatted_code: str):
+        # Eager-load the product relationship: the existing-sku branch below
+        # reads sku_entry.product, which would otherwise issue a lazy SELECT
+        # per sku.
         sku_entry: _StorageSku | None = (
-            self._session.query(_StorageSku).filter_by(code=code).first()
+            self._session.query(_StorageSku)
+            .options(orm.joinedload(_StorageSku.product))
+            .filter_by(code=code)
+            .first()
         )
 
         if sku_entry is None:
-            logger.debug(f"  SKU {code} not present in storage, adding")
-            # Create a new sku entry.
-            product_entry = self.get_product_by_code(product.code)
+            logger.debug("  SKU %s not present in storage, adding", code)
+            # Create a new sku entry.  The product passed by the caller is
+            # usually already persistent in this session; re-fetching it by
+            # code would be a redundant SELECT on products_static.
+            if sqlalchemy.inspect(product).persistent:
+                product_entry = product
+            else:
+                product_entry = self.get_product_by_code(product.code)
             assert product_entry is not None
             self._session.add(_StorageSku(code, formatted_code, product_entry))
         else:
-            logger.debug(f"  SKU {code} is already present")
+            logger.debug("  SKU %s is already present", code)
             if sku_entry.product.code != product.code:
                 # A sku with this code already exists, but it is
                 # associated with a different product. These kind of "migrations"
@@ -308,7 +606,12 @@ class ProductRepository:
                 # product (typically because it changed names). In this case,
                 # edit the existing entry.
                 logger.debug(
-                    f"  SKU {code} is associated to a different product: previous product was '{sku_entry.product.name} ({sku_entry.product.code})', new product is '{product.name} ({product.code})'"
+                    "  SKU %s is associated to a different product: previous product was '%s (%s)', new product is '%s (%s)'",
+                    code,
+                    sku_entry.product.name,
+                    sku_entry.product.code,
+                    product.name,
+                    product.code,
                 )
                 sku_entry.product = product
 
@@ -319,36 +622,166 @@ class ProductRepository:
         in_promo: bool,
         raw_payload: str,
         discard_equal: bool,
+        sample_time: datetime.datetime | None = None,
     ):
-        sku = self.get_sku_by_code(sku_code)
-        assert sku
+        # Route through the batch path so the daily rollup is maintained for
+        # single-sample inserts as well.
+        self.add_product_price_samples(
+            [Sample(sku_code, price, in_promo, raw_payload)],
+            discard_equal,
+            sample_time,
+        )
 
-        logger.debug(f"adding sample for {sku}")
+    def add_product_price_samples(
+        self,
+        samples: list[Sample],
+        discard_equal: bool,
+        sample_time: datetime.datetime | None = None,
+    ):
+        """Insert a batch of price samples.
+
+        Contrary to add_product_price_sample, this resolves the sku indexes
+        for the whole batch with a handful of SELECTs and inserts the rows
+        through a multi-row statement, instead of paying one sku lookup and
+        one unit-of-work entry per sample.
+
+        With discard_equal, a sample whose price and promo state match a
+        sku's most recent sample is not inserted at all."""
+        if not samples:
+            return
+
+        if sample_time is None:
+            sample_time = datetime.datetime.now()
+
+        codes = list({sample.sku_code for sample in samples})
+        sku_index_by_code: dict[str, int] = {}
+        for chunk_start in range(0, len(codes), self._CODES_CHUNK_SIZE):
+            chunk_end = chunk_start + self._CODES_CHUNK_SIZE
+            chunk = codes[chunk_start:chunk_end]
+            for code, index in self._session.execute(
+                sqlalchemy.select(_StorageSku.code, _StorageSku.index).where(
+                    _StorageSku.code.in_(chunk)
+                )
+            ):
+                sku_index_by_code[code] = index
 
+        last_prices: dict[int, tuple[int, bool]] = {}
         if discard_equal:
-            last_sample = (
-                self._session.query(_StorageProductSample)
-                .filter(_StorageProductSample.sku_index == sku.index)
-                .order_by(_StorageProductSample.sample_time.desc())
-                .limit(1)
-                .one_or_none()
+            # Fetch the most recent sample of every sku involved in this
+            # batch in one query per chunk; only the price and promo state
+            # are needed for the comparison below.
+            indexes = list(sku_index_by_code.values())
+            for chunk_start in range(0, len(indexes), self._CODES_CHUNK_SIZE):
+                chunk_end = chunk_start + self._CODES_CHUNK_SIZE
+                chunk = indexes[chunk_start:chunk_end]
+                last_index_subq = (
+                    sqlalchemy.select(sqlalchemy.func.max(_StorageProductSample.index))
+                    .where(_StorageProductSample.sku_index.in_(chunk))
+                    .group_by(_StorageProductSample.sku_index)
+                )
+                for sku_index, price_cents, in_promo in self._session.execute(
+                    sqlalchemy.select(
+                        _StorageProductSample.sku_index,
+                        _StorageProductSample.price_cents,
+                        _StorageProductSample.in_promo,
+                    ).where(_StorageProductSample.index.in_(last_index_subq))
+                ):
+                    # sku_index is stored with text affinity (the samples
+                    # table declares it as a string); normalize so the key
+                    # matches the integer indexes fetched from skus.
+                    last_prices[int(sku_index)] = (price_cents, bool(in_promo))
+
+        rows = []
+        for sample in samples:
+            sku_index = sku_index_by_code.get(sample.sku_code)
+            assert sku_index is not None
+
+            price_cents = int(sample.price * 100)
+
+            # A sample that doesn't move the price or promo state carries no
+            # information; skip the insert entirely rather than paying the
+            # write (and scanning past the row forever after).
+            if discard_equal and last_prices.get(sku_index) == (
+                price_cents,
+                sample.in_promo,
+            ):
+                continue
+
+            last_prices[sku_index] = (price_cents, sample.in_promo)
+
+            rows.append(
+                {
+                    "sku_index": sku_index,
+                    "sample_time": sample_time,
+                    "in_promo": sample.in_promo,
+                    "raw_payload": sample.raw_payload,
+                    "price_cents": price_cents,
+                }
             )
 
-            if last_sample:
-                equal = price == last_sample.price
-                logger.debug(
-                    f"last price={last_sample.price}, new price={price}, equal={equal}"
-                )
+        for chunk_start in range(0, len(rows), self._CODES_CHUNK_SIZE):
+            chunk_end = chunk_start + self._CODES_CHUNK_SIZE
+            self._session.execute(
+                sqlalchemy.insert(_StorageProductSample),
+                rows[chunk_start:chunk_end],
+            )
 
-                if equal:
-                    self._session.delete(last_sample)
+        self._update_daily_rollup(rows, sample_time.date())
+
+    def _update_daily_rollup(self, rows: list[dict], day: datetime.date):
+        """Fold a batch of sample rows into the per-day price rollup."""
+        # Aggregate within the batch first so each (sku, day) pair is
+        # upserted at most once.
+        batch_rollup: dict[int, dict] = {}
+        for row in rows:
+            rollup_row = batch_rollup.get(row["sku_index"])
+            if rollup_row is None:
+                batch_rollup[row["sku_index"]] = {
+                    "sku_index": row["sku_index"],
+                    "day": day,
+                    "min_price_cents": row["price_cents"],
+                    "max_price_cents": row["price_cents"],
+                    "last_price_cents": row["price_cents"],
+                }
             else:
-                logger.debug("no previous sample found")
+                rollup_row["min_price_cents"] = min(
+                    rollup_row["min_price_cents"], row["price_cents"]
+                )
+                rollup_row["max_price_cents"] = max(
+                    rollup_row["max_price_cents"], row["price_cents"]
+                )
+                rollup_row["last_price_cents"] = row["price_cents"]
+
+        upsert = sqlalchemy.dialects.sqlite.insert(_StorageProductPriceDaily)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=["sku_index", "day"],
+            set_={
+                "min_price_cents": sqlalchemy.func.min(
+                    _StorageProductPriceDaily.min_price_cents,
+                    upsert.excluded.min_price_cents,
+                ),
+                "max_price_cents": sqlalchemy.func.max(
+                    _StorageProductPriceDaily.max_price_cents,
+                    upsert.excluded.max_price_cents,
+                ),
+                "last_price_cents": upsert.excluded.last_price_cents,
+            },
+        )
 
-        new_sample = _StorageProductSample(
-            price=price, in_promo=in_promo, raw_payload=raw_payload, sku=sku
+        rollup_rows = list(batch_rollup.values())
+        for chunk_start in range(0, len(rollup_rows), self._CODES_CHUNK_SIZE):
+            chunk_end = chunk_start + self._CODES_CHUNK_SIZE
+            self._session.execute(upsert, rollup_rows[chunk_start:chunk_end])
+
+    def get_daily_price_history_by_sku_code(
+        self, sku_code: str
+    ) -> orm.Query[_StorageProductPriceDaily]:
+        return (
+            self._session.query(_StorageProductPriceDaily)
+            .join(_StorageSku, _StorageSku.index == _StorageProductPriceDaily.sku_index)
+            .filter(_StorageSku.code == sku_code)
+            .order_by(_StorageProductPriceDaily.day)
         )
-        self._session.add(new_sample)
 
     def delete_sample(self, sample: _StorageProductSample):
         self._session.delete(sample)
@@ -1,7 +1,14 @@
 from __future__ import annotations
 
+import collections
+import concurrent.futures
 import decimal
+import functools
+import itertools
+import json
 import logging
+import operator
+import random
 import time
 from collections.abc import Iterable, Iterator, Sequence
 from datetime import datetime
@@ -9,16 +16,21 @@ from typing import Callable, Generator, Optional, Tuple
 
 import latest_user_agents
 import requests
+import requests.adapters
+from urllib3.util.retry import Retry
 
 logger = logging.getLogger(__name__)
 
 
 class _ProductCategory:
+    __slots__ = ("_id", "_name", "_subcategories", "_parent", "_full_name")
+
     def __init__(self, id: str, name: str, subcategories: list[_ProductCategory]):
         self._id = id
         self._name = name
         self._subcategories = subcategories
         self._parent = None
+        self._full_name = None
 
         for sub in self._subcategories:
             sub._parent = self
@@ -33,10 +45,16 @@ class _ProductCategory:
 
     @property
     def full_name(self) -> str:
-        if self._parent:
-            return f"{self._parent.full_name} > {self.name}"
-        else:
-            return self.name
+        # Computed lazily (the parent is only known once the enclosing
+        # category is built) and memoized, as this is accessed for every
+        # page fetch when logging.
+        if self._full_name is None:
+            if self._parent:
+                self._full_name = f"{self._parent.full_name} > {self.name}"
+            else:
+                self._full_name = self.name
+
+        return self._full_name
 
     @property
     def subcategories(self) -> list[_ProductCategory]:
@@ -50,9 +68,14 @@ class _ProductCategory:
     def iter_preorder(
         self, level: int
     ) -> Generator[Tuple[_ProductCategory, int], None, None]:
-        yield self, level
-        for cat in self.subcategories:
-            yield from cat.iter_preorder(level + 1)
+        # Explicit stack rather than recursive generators: a nested
+        # `yield from` chain pays one frame per tree level for every yielded
+        # node.  Children are pushed in reverse so they pop in order.
+        stack: list[tuple[_ProductCategory, int]] = [(self, level)]
+        while stack:
+            cat, cat_level = stack.pop()
+            yield cat, cat_level
+            stack.extend((sub, cat_level + 1) for sub in reversed(cat._subcategories))
 
 
 class _ProductCategories:
@@ -96,13 +119,73 @@ _base_headers = {
     "pragma": "no-cache",
 }
 
+# Shared HTTP session: keep-alive amortizes the TCP and TLS handshake cost
+# across the many small API requests a scrape makes.  Per-request headers
+# passed to get/post are merged over the session's base headers.
+#
+# Everything goes to a single host, so mount one adapter with a connection
+# pool sized for the price-fetch worker threads and urllib3-level retries
+# for connection failures and transient statuses (which honour Retry-After);
+# the scrapers' retry loops keep handling the API's 400/404 semantics.
+_session = requests.Session()
+_session.headers.update(_base_headers)
+# Ask for compressed responses and keep-alive explicitly rather than relying
+# on library defaults; urllib3 decompresses transparently.  Brotli is left
+# out since it would require an extra dependency for a marginal gain over
+# gzip on these payloads.
+_session.headers["accept-encoding"] = "gzip, deflate"
+_session.headers["connection"] = "keep-alive"
+_session.mount(
+    "https://",
+    requests.adapters.HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=16,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=(429, 502, 503, 504),
+            allowed_methods=None,
+            # Hand the final response back rather than raising RetryError:
+            # the callers' retry loops inspect the status code themselves
+            # and map it to the API-specific exceptions.
+            raise_on_status=False,
+        ),
+    ),
+)
+
+
+@functools.lru_cache(maxsize=1)
+def _user_agents() -> tuple[str, ...]:
+    # latest_user_agents re-validates its download cache on every call;
+    # snapshot the list once per process since a scrape run is short-lived.
+    return tuple(latest_user_agents.get_latest_user_agents())
+
 
-@staticmethod
 def _random_user_agent() -> str:
-    return latest_user_agents.get_random_user_agent()
+    return random.choice(_user_agents())
+
+
+def _retry_delay(ntry: int, response: requests.Response | None = None) -> float:
+    """Seconds to wait before retry number `ntry`.
+
+    Exponential backoff with jitter, capped at 30 seconds; a Retry-After
+    header from the server takes precedence when it is a plain delay."""
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+
+    return min(30, 0.5 * 2**ntry) + random.random()
 
 
 class Product:
+    # These classes are built once per scraped row; __slots__ drops the
+    # per-instance __dict__ and its memory/lookup cost.
+    __slots__ = ("_code", "_name", "_is_in_clearance", "_url")
+
     def __init__(self, code: str, name: str, is_in_clearance: bool, url: str):
         self._code = code
         self._name = name
@@ -135,6 +218,8 @@ class Product:
 
 
 class Sku:
+    __slots__ = ("_code", "_formatted_code")
+
     def __init__(self, code: str, formatted_code: str):
         self._code = code
         self._formatted_code = formatted_code
@@ -156,33 +241,54 @@ class Sku:
 
 
 class PriceInfo:
+    """Parsed view of one sku entry in a price query response.
+
+    The fields of interest are extracted (and the payload serialized) once
+    at construction, so the decoded JSON subtree can be collected right away
+    instead of living as long as the PriceInfo does."""
+
+    __slots__ = ("_code", "_price", "_in_promo", "_raw_payload")
+
     def __init__(self, result: dict):
-        self._raw_payload = result
+        self._code = result["code"]
 
-    @property
-    def price(self) -> decimal.Decimal | None:
-        current_price = self._raw_payload["currentPrice"]
+        # Some partial payloads omit these fields entirely rather than
+        # carrying an explicit null; .get() treats both the same way.
+        current_price = result.get("currentPrice")
         if current_price is None:
-            return None
+            self._price = None
+        else:
+            value = current_price["value"]
+            assert isinstance(value, (float, int))
+            # Round-trip through str() so a float's shortest repr (e.g.
+            # "19.99") becomes the exact decimal rather than its binary
+            # approximation.
+            self._price = decimal.Decimal(str(value))
 
-        value = current_price["value"]
-        assert type(value) in [decimal.Decimal, int]
-        return decimal.Decimal(value)
+        self._in_promo = result.get("priceValidUntil") is not None
+
+        # Serialize to compact JSON rather than the dict's repr: it is
+        # smaller (no spaces, double quotes) and can be parsed back.
+        self._raw_payload = json.dumps(result, separators=(",", ":"))
+
+    @property
+    def price(self) -> decimal.Decimal | None:
+        return self._price
 
     @property
     def code(self) -> str:
-        return self._raw_payload["code"]
+        return self._code
 
     @property
     def in_promo(self) -> bool:
-        return self._raw_payload["priceValidUntil"] is not None
+        return self._in_promo
 
     @property
     def raw_payload(self) -> str:
-        return str(self._raw_payload)
+        return self._raw_payload
 
     def __repr__(self) -> str:
-        return str(self.__dict__)
+        return self._raw_payload
 
 
 class ProductInventory(Iterable):
@@ -214,9 +320,15 @@ class ProductInventory(Iterable):
         # it will take a few more days to discover a new product that only appears
         # in a specific category level, for some reason.
         self._categories = self._fetch_categories()
+
+        # Walk the tree once: log it, find the deepest level and keep the
+        # flattened (category, level) list around so the per-level filter
+        # below doesn't have to re-descend the tree.
+        all_categories = []
         max_level = 0
         for cat, level in self._categories.iter_preorder():
-            logger.debug(f"[{level}] {cat.id} - {cat.full_name}")
+            logger.debug("[%d] %s - %s", level, cat.id, cat.full_name)
+            all_categories.append((cat, level))
             max_level = max(level, max_level)
 
         if category_levels_to_scrape is None:
@@ -227,11 +339,15 @@ class ProductInventory(Iterable):
 
         logger.debug(f"Category levels to scrape: {self._category_levels_to_scrape}")
 
+        levels = frozenset(self._category_levels_to_scrape)
+        self._scrape_targets = [
+            (cat, level) for cat, level in all_categories if level in levels
+        ]
+
     def _fetch_categories(self) -> _ProductCategories:
         """Fetch the list of categories, create some objects out of it."""
-        response = requests.get(
+        response = _session.get(
             "https://apim.canadiantire.ca/v1/category/api/v1/categories",
-            headers=_base_headers,
             params={"lang": "en_CA"},
         )
 
@@ -240,82 +356,144 @@ class ProductInventory(Iterable):
             raise RuntimeError("Failed to get category list")
 
         def _handle_categories(raw: list[dict]) -> list[_ProductCategory]:
-            def _handle_one_category(raw: dict) -> _ProductCategory:
-                subcats = _handle_categories(raw["subcategories"])
-                return _ProductCategory(raw["id"], raw["name"], subcats)
-
-            cats = []
-            for c in raw:
-                cats.append(_handle_one_category(c))
-            cats.sort(key=lambda category: category.name)
+            # Build the tree with an explicit stack rather than recursing per
+            # level.  A node is visited twice: once to queue its
+            # subcategories, and once (after they are built) to sort them and
+            # construct it, so children exist before their parent and the
+            # parent wiring stays the single pass done in
+            # _ProductCategory.__init__.
+            by_name = operator.attrgetter("name")
+            cats: list[_ProductCategory] = []
+            stack: list[
+                tuple[dict, list[_ProductCategory], list[_ProductCategory] | None]
+            ] = [(c, cats, None) for c in raw]
+
+            while stack:
+                raw_cat, out, subcats = stack.pop()
+                if subcats is None:
+                    subcats = []
+                    stack.append((raw_cat, out, subcats))
+                    stack.extend(
+                        (sub, subcats, None) for sub in raw_cat["subcategories"]
+                    )
+                else:
+                    subcats.sort(key=by_name)
+                    out.append(
+                        _ProductCategory(raw_cat["id"], raw_cat["name"], subcats)
+                    )
+
+            cats.sort(key=by_name)
             return cats
 
         categories = _handle_categories(response.json()["categories"])
         return _ProductCategories(categories)
 
     @staticmethod
-    def _request_page(
-        cat: _ProductCategory, cat_level: int, page_number: int = 1
-    ) -> requests.Response:
-        """Fetch one page of products."""
-        return requests.get(
-            f"https://apim.canadiantire.ca/v1/search/search?store=64&lang=en_CA&x1=ast-id-level-{cat_level}&q1={cat.id}&experience=category;count=48;page={page_number}",
-            headers=_base_headers,
+    def _listing_url_template(cat: _ProductCategory, cat_level: int) -> str:
+        """Build the listing URL template of a category; only the page number
+        varies across a category's pages, so it is left as a %d slot."""
+        return (
+            "https://apim.canadiantire.ca/v1/search/search?store=64&lang=en_CA"
+            f"&x1=ast-id-level-{cat_level}&q1={cat.id}"
+            "&experience=category;count=48;page=%d"
         )
 
-    def __iter__(self) -> Iterator[Product]:
-        num_categories_scraped = 0
+    @staticmethod
+    def _request_page(url: str) -> requests.Response:
+        """Fetch one page of products."""
+        return _session.get(url)
 
-        for cat, level in self._categories.iter_preorder():
-            if level not in self._category_levels_to_scrape:
-                continue
+    # Number of listing page requests kept in flight per category.
+    _MAX_PAGE_WORKERS = 8
 
-            num_categories_scraped += 1
+    @staticmethod
+    def _fetch_listing_page(url: str) -> dict | None:
+        """Fetch and decode one listing page, retrying transient failures.
 
-            logger.debug(f"Starting category {cat.full_name}")
-            page = 1
-            num_pages = None
+        Returns None if the page could not be fetched."""
+        for ntry in range(5):
+            logger.debug("Fetching listing page %s", url)
+            try:
+                return ProductInventory._request_page(url).json()
+            except Exception as e:
+                logger.warning(f"Page request failed with exception: {e}")
+                time.sleep(_retry_delay(ntry))
 
-            while num_pages is None or page < (num_pages + 1):
-                logger.debug(
-                    f"Fetching listing of category {cat.full_name} (page {page}/{num_pages})"
-                )
-                try:
-                    response = ProductInventory._request_page(
-                        cat, level, page_number=page
-                    )
-                except Exception as e:
-                    logger.warning(f"Page request failed with exception: {e}")
-                    continue
+        logger.error(f"Giving up on listing page {url}")
+        return None
+
+    def _iter_category_pages(
+        self,
+        executor: concurrent.futures.ThreadPoolExecutor,
+        cat: _ProductCategory,
+        level: int,
+    ) -> Iterator[dict]:
+        """Yield the decoded listing pages of a category, in page order.
+
+        Page 1 has to be fetched on its own to discover the page count; the
+        remaining pages are independent, so they are downloaded through the
+        executor with a bounded in-flight window."""
+        url_template = ProductInventory._listing_url_template(cat, level)
+
+        first_page = self._fetch_listing_page(url_template % 1)
+        if first_page is None:
+            return
 
-                response = response.json()
+        yield first_page
 
-                if num_pages is None:
-                    num_pages = int(response["pagination"]["total"])
+        num_pages = int(first_page["pagination"]["total"])
+        if self._dev_max_pages_per_category != 0:
+            num_pages = min(num_pages, self._dev_max_pages_per_category)
 
-                for product in response["products"]:
-                    assert product["type"] == "PRODUCT"
+        in_flight: collections.deque[concurrent.futures.Future] = collections.deque()
+
+        for page_number in range(2, num_pages + 1):
+            in_flight.append(
+                executor.submit(self._fetch_listing_page, url_template % page_number)
+            )
+
+            if len(in_flight) >= self._MAX_PAGE_WORKERS * 2:
+                page = in_flight.popleft().result()
+                if page is not None:
+                    yield page
+
+        while in_flight:
+            page = in_flight.popleft().result()
+            if page is not None:
+                yield page
+
+    def __iter__(self) -> Iterator[Product]:
+        num_categories_scraped = 0
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=self._MAX_PAGE_WORKERS
+        ) as executor:
+            for cat, level in self._scrape_targets:
+                num_categories_scraped += 1
+
+                logger.debug("Starting category %s", cat.full_name)
+
+                for response in self._iter_category_pages(executor, cat, level):
+                    for product in response["products"]:
+                        if product["type"] != "PRODUCT":
+                            logger.debug(
+                                "Skipping non-product listing entry of type %s",
+                                product["type"],
+                            )
+                            continue
 
-                    code = product["code"]
-                    url = product["url"]
-                    name = product["title"]
-                    is_in_clearance = "CLEARANCE" in product["badges"]
-                    yield Product(code, name, is_in_clearance, url)
+                        code = product["code"]
+                        url = product["url"]
+                        name = product["title"]
+                        is_in_clearance = "CLEARANCE" in product["badges"]
+                        yield Product(code, name, is_in_clearance, url)
 
                 if (
-                    self._dev_max_pages_per_category != 0
-                    and self._dev_max_pages_per_category == page
+                    self._dev_max_categories != 0
+                    and self._dev_max_categories == num_categories_scraped
                 ):
                     break
 
-                page = page + 1
-
-            if (
-                self._dev_max_categories != 0
-                and self._dev_max_categories == num_categories_scraped
-            ):
-                break
-
 
 class NoSuchProductException(RuntimeError):
     pass
@@ -332,11 +510,9 @@ class SkusInventory(Iterable):
     @staticmethod
     def _request_page(product_code: str) -> requests.Response:
         """Fetch one product page."""
-        headers = _base_headers.copy()
-        headers["user-agent"] = _random_user_agent()
-        return requests.get(
+        return _session.get(
             f"https://apim.canadiantire.ca/v1/product/api/v1/product/productFamily/{product_code}?baseStoreId=CTR&lang=en_CA&storeId=64",
-            headers=headers,
+            headers={"user-agent": _random_user_agent()},
             timeout=10,
         )
 
@@ -347,7 +523,7 @@ class SkusInventory(Iterable):
                 raise NoSuchProductException
             if resp.status_code not in (200, 206):
                 logger.error(f"Got status code {resp.status_code} on try {ntry}")
-                time.sleep(5)
+                time.sleep(_retry_delay(ntry, resp))
                 continue
 
             resp = resp.json()
@@ -376,31 +552,44 @@ class _PriceQueryException(Exception):
 
 
 class ProductLedger(Iterable):
-    def __init__(self, sku_codes: Iterator[str]):
+    # The PriceAvailability API rejects batches of more than 50 skus.
+    _MAX_BATCH_SIZE = 50
+
+    def __init__(self, sku_codes: Iterator[str], batch_size: int = _MAX_BATCH_SIZE):
+        if not 0 < batch_size <= self._MAX_BATCH_SIZE:
+            raise ValueError(f"batch_size must be between 1 and {self._MAX_BATCH_SIZE}")
+
         self._sku_codes = sku_codes
-        pass
+        self._batch_size = batch_size
 
     @staticmethod
-    def _batches(it: Iterator, batch_max_size: int) -> Generator[list, None, None]:
-        batch = []
-        for element in it:
-            batch.append(element)
-            if len(batch) == batch_max_size:
-                yield batch
-                batch = []
-
-        if len(batch) > 0:
+    def _unique(codes: Iterator[str]) -> Iterator[str]:
+        """Yield codes, skipping ones already seen.
+
+        The same sku can be fed in several times (a product listed under
+        multiple scraped categories); one price query per run is enough."""
+        seen = set()
+        for code in codes:
+            if code not in seen:
+                seen.add(code)
+                yield code
+
+    @staticmethod
+    def _batches(it: Iterator, batch_max_size: int) -> Generator[tuple, None, None]:
+        # islice pulls each chunk at C level instead of appending and
+        # length-checking element by element in Python.
+        it = iter(it)
+        while batch := tuple(itertools.islice(it, batch_max_size)):
             yield batch
 
     @staticmethod
     def _request_price_infos(sku_codes: Sequence[str]) -> requests.Response:
-        for ntry in range(5):
-            url = "https://apim.canadiantire.ca/v1/product/api/v1/product/sku/PriceAvailability/?lang=en_CA&storeId=64"
-            headers = _base_headers.copy()
-            headers["user-agent"] = _random_user_agent()
-            headers["content-type"] = "application/json"
+        url = "https://apim.canadiantire.ca/v1/product/api/v1/product/sku/PriceAvailability/?lang=en_CA&storeId=64"
 
-            body = {
+        # Encode the body once: it is the same for every retry, and passing
+        # the bytes directly skips re-serializing 50 dicts per attempt.
+        body = json.dumps(
+            {
                 "skus": [
                     {
                         "code": sku_code,
@@ -408,16 +597,38 @@ class ProductLedger(Iterable):
                     }
                     for sku_code in sku_codes
                 ]
-            }
+            },
+            separators=(",", ":"),
+        ).encode()
+
+        headers = {
+            "user-agent": _random_user_agent(),
+            "content-type": "application/json",
+        }
+
+        for ntry in range(5):
+            if ntry:
+                # Only rotate the user-agent when a retry actually happens.
+                headers["user-agent"] = _random_user_agent()
 
+            # %-style formatting so the 50-code tuple is only rendered when
+            # debug logging is actually enabled.
             logger.debug(
-                f"Sending batched price info query request: ntry={ntry} batch_size={len(sku_codes)} sku_codes={sku_codes}"
+                "Sending batched price info query request: ntry=%d batch_size=%d sku_codes=%s",
+                ntry,
+                len(sku_codes),
+                sku_codes,
             )
             try:
-                response = requests.post(url, headers=headers, json=body, timeout=10)
+                response = _session.post(url, headers=headers, data=body, timeout=10)
             except Exception as e:
                 logger.warning(
-                    f"Batched price info query request failed with exception: ntry={ntry} batch_size={len(sku_codes)} sku_codes={sku_codes}, exception={e}"
+                    "Batched price info query request failed with exception: "
+                    "ntry=%d batch_size=%d sku_codes=%s, exception=%s",
+                    ntry,
+                    len(sku_codes),
+                    sku_codes,
+                    e,
                 )
                 continue
 
@@ -433,7 +644,7 @@ class ProductLedger(Iterable):
                         "Failed to get product info", response.status_code
                     )
 
-                time.sleep(5)
+                time.sleep(_retry_delay(ntry, response))
                 continue
 
             return response
@@ -445,10 +656,11 @@ class ProductLedger(Iterable):
         sku_codes: Sequence[str],
     ) -> Sequence[PriceInfo]:
         try:
-            response_skus = ProductLedger._request_price_infos(sku_codes).json(
-                parse_float=decimal.Decimal
-            )["skus"]
-            logger.debug("Received {} price infos".format(len(response_skus)))
+            # Plain json() uses the C scanner; parse_float=Decimal forced the
+            # pure-Python parser with a callback per number.  Prices are
+            # converted to Decimal lazily in PriceInfo.price instead.
+            response_skus = ProductLedger._request_price_infos(sku_codes).json()["skus"]
+            logger.debug("Received %d price infos", len(response_skus))
             return [PriceInfo(price_info) for price_info in response_skus]
 
         except _PriceQueryException as batch_query_exception:
@@ -481,11 +693,39 @@ class ProductLedger(Iterable):
             else:
                 raise batch_query_exception
 
+    # Number of price info requests kept in flight at once.  The queries are
+    # network-latency-bound, so overlapping a few round-trips makes the
+    # wall-clock time scale with batches / workers instead of batches.
+    _MAX_WORKERS = 8
+
+    @staticmethod
+    def _yield_completed(
+        in_flight: collections.deque[concurrent.futures.Future],
+    ) -> Iterator[PriceInfo]:
+        """Yield the price infos of the oldest in-flight request."""
+        try:
+            yield from in_flight.popleft().result()
+        except _PriceQueryException:
+            pass
+
     def __iter__(self) -> Iterator[PriceInfo]:
-        # The API limits requests to 50 products
-        for batch in self._batches(self._sku_codes, 50):
-            try:
-                for price_info in self._get_price_infos(batch):
-                    yield price_info
-            except _PriceQueryException:
-                pass
+        # Keep a bounded window of batch requests in flight and yield the
+        # results in submission order, so the consumer sees the same sequence
+        # as with serial fetches.
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=self._MAX_WORKERS
+        ) as executor:
+            in_flight: collections.deque[
+                concurrent.futures.Future
+            ] = collections.deque()
+
+            for batch in self._batches(self._unique(self._sku_codes), self._batch_size):
+                in_flight.append(executor.submit(ProductLedger._get_price_infos, batch))
+
+                # Bound the window so we don't read the whole sku list (and
+                # queue its requests) ahead of the consumer.
+                if len(in_flight) >= self._MAX_WORKERS * 2:
+                    yield from self._yield_completed(in_flight)
+
+            while in_flight:
+                yield from self._yield_completed(in_flight)
@@ -1,5 +1,8 @@
+import datetime
+import decimal
 import os
 import os.path
+import types
 
 import pytest
 import sqlalchemy
@@ -12,11 +15,8 @@ import alembic.script
 from canadiantracker import storage
 
 
-# Create a database in a temporary directory and initialize it with the
-# expected schema.  Return a repository object using that database.
-@pytest.fixture
-def repository(tmp_path: str) -> storage.ProductRepository:
-    sqlite_db_path = os.path.join(tmp_path, "inventory.db")
+def _migrate(sqlite_db_path: str, upper: str, lower: str = "base") -> None:
+    """Run the migrations in [LOWER, UPPER] against the given database."""
     engine = sqlalchemy.create_engine(f"sqlite:///{sqlite_db_path}")
     conn = engine.connect()
     config = alembic.config.Config()
@@ -31,12 +31,7 @@ def repository(tmp_path: str) -> storage.ProductRepository:
     ) -> list[alembic.migration.MigrationStep]:
         assert mc.script
         rev_scripts = reversed(
-            list(
-                mc.script.iterate_revisions(
-                    lower="base",
-                    upper=storage.ProductRepository.ALEMBIC_REVISION,
-                )
-            )
+            list(mc.script.iterate_revisions(lower=lower, upper=upper))
         )
 
         return [
@@ -50,12 +45,42 @@ def repository(tmp_path: str) -> storage.ProductRepository:
         config,
         script,
         fn=do_upgrade,
-        destination_rev=storage.ProductRepository.ALEMBIC_REVISION,
+        destination_rev=upper,
     ) as ec:
         ec.configure(connection=conn)
         ec.run_migrations()
 
-    return storage.ProductRepository(sqlite_db_path)
+    conn.close()
+    engine.dispose()
+
+
+# Create a database in a temporary directory and initialize it with the
+# expected schema.  Return its path.
+@pytest.fixture
+def database_path(tmp_path: str) -> str:
+    sqlite_db_path = os.path.join(tmp_path, "inventory.db")
+    _migrate(sqlite_db_path, storage.ProductRepository.ALEMBIC_REVISION)
+    return sqlite_db_path
+
+
+@pytest.fixture
+def repository(database_path: str) -> storage.ProductRepository:
+    return storage.ProductRepository(database_path)
+
+
+def _listing(
+    code: str, name: str = "Hello", url: str = "/foo"
+) -> types.SimpleNamespace:
+    return types.SimpleNamespace(code=code, name=name, is_in_clearance=False, url=url)
+
+
+def _add_sku(
+    repository: storage.ProductRepository, product_code: str, sku_code: str
+) -> None:
+    repository.add_product(product_code, "Hello", False, "/foo")
+    product = repository.get_product_by_code(product_code)
+    assert product
+    repository.add_sku(product, sku_code, f"{sku_code}-formatted")
 
 
 def test_add_product(repository: storage.ProductRepository):
@@ -104,3 +129,185 @@ def test_get_product_by_code(repository: storage.ProductRepository):
 def test_get_product_by_code_wrong_code_format(repository: storage.ProductRepository):
     with pytest.raises(ValueError):
         repository.get_product_by_code("1234567p")
+
+
+def test_add_products_upsert(repository: storage.ProductRepository):
+    repository.add_products([_listing("1234567P"), _listing("2345678P")])
+    assert repository.products().count() == 2
+
+    # Listing the same codes again must update the existing entries in place
+    # rather than raise on the unique code constraint.
+    repository.add_products([_listing("1234567P", name="Goodbye", url="/bar")])
+    assert repository.products().count() == 2
+    product = repository.get_product_by_code("1234567P")
+    assert product
+    assert product.name == "Goodbye"
+    assert product.url == "/bar"
+
+
+def test_add_products_skips_invalid_code(repository: storage.ProductRepository):
+    # An entry with a malformed code is skipped with a warning; the rest of
+    # the batch must still be ingested.
+    repository.add_products([_listing("bogus"), _listing("1234567P")])
+    products = list(repository.products())
+    assert len(products) == 1
+    assert products[0].code == "1234567P"
+
+
+def test_list_products_filter_chunking(repository: storage.ProductRepository):
+    # More codes than fit in a single IN (...) clause; the filtered listing
+    # must transparently chunk the query.
+    codes = [f"{i:07}P" for i in range(1, 602)]
+    repository.add_products([_listing(code) for code in codes])
+
+    products = list(repository.products(codes))
+    assert len(products) == len(codes)
+    assert {p.code for p in products} == set(codes)
+
+
+def test_add_product_price_samples(repository: storage.ProductRepository):
+    _add_sku(repository, "1234567P", "11111111")
+    _add_sku(repository, "2345678P", "22222222")
+
+    repository.add_product_price_samples(
+        [
+            storage.Sample("11111111", decimal.Decimal("9.99"), False, "{}"),
+            storage.Sample("22222222", decimal.Decimal("19.99"), True, "{}"),
+        ],
+        discard_equal=False,
+    )
+
+    samples = list(repository.samples_by_sku_code("11111111"))
+    assert len(samples) == 1
+    assert samples[0].price == decimal.Decimal("9.99")
+    assert not samples[0].in_promo
+
+    latest = repository.get_latest_sample_by_sku_code("22222222")
+    assert latest
+    assert latest.price == decimal.Decimal("19.99")
+    assert latest.in_promo
+
+
+def test_add_product_price_samples_discard_equal(
+    repository: storage.ProductRepository,
+):
+    _add_sku(repository, "1234567P", "11111111")
+
+    def sample_at(price: str, hour: int) -> None:
+        repository.add_product_price_samples(
+            [storage.Sample("11111111", decimal.Decimal(price), False, "{}")],
+            discard_equal=True,
+            sample_time=datetime.datetime(2022, 1, 1, hour),
+        )
+
+    sample_at("9.99", 1)
+    # Same price and promo state as the latest sample: no new row.
+    sample_at("9.99", 2)
+    assert len(list(repository.samples_by_sku_code("11111111"))) == 1
+
+    # A price change must be recorded.
+    sample_at("8.99", 3)
+    assert len(list(repository.samples_by_sku_code("11111111"))) == 2
+
+
+def test_daily_rollup(repository: storage.ProductRepository):
+    _add_sku(repository, "1234567P", "11111111")
+
+    for hour, price in ((1, "9.99"), (2, "7.99"), (3, "8.99")):
+        repository.add_product_price_samples(
+            [storage.Sample("11111111", decimal.Decimal(price), False, "{}")],
+            discard_equal=False,
+            sample_time=datetime.datetime(2022, 1, 1, hour),
+        )
+
+    history = list(repository.get_daily_price_history_by_sku_code("11111111"))
+    assert len(history) == 1
+    assert history[0].day == datetime.date(2022, 1, 1)
+    assert history[0].min_price_cents == 799
+    assert history[0].max_price_cents == 999
+    assert history[0].last_price_cents == 899
+
+
+def test_daily_rollup_single_sample_path(repository: storage.ProductRepository):
+    # The single-sample entry point must maintain the rollup too.
+    _add_sku(repository, "1234567P", "11111111")
+    repository.add_product_price_sample(
+        "11111111", decimal.Decimal("9.99"), False, "{}", discard_equal=False
+    )
+
+    history = list(repository.get_daily_price_history_by_sku_code("11111111"))
+    assert len(history) == 1
+    assert history[0].min_price_cents == 999
+    assert history[0].last_price_cents == 999
+
+
+def test_daily_rollup_migration_backfill(tmp_path: str):
+    # Migrate up to the revision preceding the rollup table, insert samples
+    # the way an old database would hold them, and complete the migrations:
+    # the backfill must aggregate the pre-existing history.
+    sqlite_db_path = os.path.join(tmp_path, "inventory.db")
+    _migrate(sqlite_db_path, "b7d41c0a9f23")
+
+    engine = sqlalchemy.create_engine(f"sqlite:///{sqlite_db_path}")
+    with engine.begin() as conn:
+        conn.execute(
+            sqlalchemy.text(
+                "INSERT INTO products_static (name, code, is_in_clearance, "
+                "last_listed, url) VALUES ('Hello', '1234567P', 0, "
+                "'2022-01-01 00:00:00', '/foo')"
+            )
+        )
+        conn.execute(
+            sqlalchemy.text(
+                "INSERT INTO skus (code, formatted_code, product_index) "
+                "VALUES ('11111111', '111-1111', 1)"
+            )
+        )
+        for sample_time, price_cents in (
+            ("2022-01-01 01:00:00", 999),
+            ("2022-01-01 02:00:00", 799),
+            ("2022-01-02 01:00:00", 899),
+        ):
+            conn.execute(
+                sqlalchemy.text(
+                    "INSERT INTO samples (sample_time, sku_index, in_promo, "
+                    "raw_payload, price_cents) VALUES "
+                    f"('{sample_time}', 1, 0, '{{}}', {price_cents})"
+                )
+            )
+    engine.dispose()
+
+    _migrate(
+        sqlite_db_path,
+        storage.ProductRepository.ALEMBIC_REVISION,
+        lower="b7d41c0a9f23",
+    )
+
+    repository = storage.ProductRepository(sqlite_db_path)
+    history = list(repository.get_daily_price_history_by_sku_code("11111111"))
+    assert len(history) == 2
+    assert history[0].day == datetime.date(2022, 1, 1)
+    assert history[0].min_price_cents == 799
+    assert history[0].max_price_cents == 999
+    assert history[0].last_price_cents == 799
+    assert history[1].day == datetime.date(2022, 1, 2)
+    assert history[1].last_price_cents == 899
+
+
+def test_context_manager_commits_on_clean_exit(database_path: str):
+    with storage.ProductRepository(database_path) as repository:
+        repository.add_product("1234567P", "Hello", False, "/foo")
+
+    with storage.ProductRepository(database_path) as repository:
+        assert repository.get_product_by_code("1234567P") is not None
+
+
+def test_context_manager_rolls_back_on_exception(database_path: str):
+    with pytest.raises(RuntimeError):
+        with storage.ProductRepository(database_path) as repository:
+            repository.add_product("1234567P", "Hello", False, "/foo")
+            repository.flush()
+            raise RuntimeError("boom")
+
+    with storage.ProductRepository(database_path) as repository:
+        assert repository.get_product_by_code("1234567P") is None